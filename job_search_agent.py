@@ -1,19 +1,85 @@
 import streamlit as st
-import gspread
 import os
 import json
-from google.oauth2.service_account import Credentials
-import anthropic
 from datetime import datetime
 import re
+import asyncio
+import time
+import threading
+import logging
+import io
+import pandas as pd
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+logger = logging.getLogger(__name__)
+# The root logger defaults to WARNING, so give this module its own INFO handler (once, not per rerun)
+if not logger.handlers:
+    _log_handler = logging.StreamHandler()
+    _log_handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+    logger.addHandler(_log_handler)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
 
 # Streamlit page config
 st.set_page_config(page_title="VP Sales Job Search Agent", layout="wide")
 
-# Initialize Anthropic client
-client = anthropic.Anthropic(api_key=st.secrets.get("ANTHROPIC_API_KEY"))
+# Session state defaults, so the rest of the script can read every key directly
+for key, default in (("current_job", None), ("current_email", None), ("pending_rows", []),
+                     ("matched_jobs", []), ("batch_drafts", []),
+                     ("email_batch", None)):
+    st.session_state.setdefault(key, default)
+
+# Anthropic setup (imported on first use, not on every cold start)
+# Retries per request; the SDK backs off exponentially on 429s and honors retry-after
+ANTHROPIC_MAX_RETRIES = 5
+
+@st.cache_resource(show_spinner=False)
+def _build_anthropic_client(api_key):
+    """Build the Anthropic client once per key, on a pooled keep-alive httpx client"""
+    import anthropic
+    import httpx
+    
+    http_client = httpx.Client(
+        limits=httpx.Limits(max_connections=20, max_keepalive_connections=20),
+        timeout=30.0
+    )
+    return anthropic.Anthropic(api_key=api_key, http_client=http_client, max_retries=ANTHROPIC_MAX_RETRIES)
+
+def get_anthropic_client():
+    """Return the cached Anthropic client, or None if no API key is configured"""
+    api_key = st.secrets.get("ANTHROPIC_API_KEY")
+    if not api_key:
+        return None
+    return _build_anthropic_client(api_key)
+
+MISSING_KEY_MESSAGE = "Error generating email: ANTHROPIC_API_KEY not configured in secrets."
 
 # Google Sheets setup
+@st.cache_resource(show_spinner=False)
+def _get_gspread_client(creds_json):
+    """Build credentials and authorize gspread once per service account"""
+    import gspread
+    from google.oauth2.service_account import Credentials
+    from requests.adapters import HTTPAdapter
+    
+    credentials = Credentials.from_service_account_info(
+        json.loads(creds_json),
+        scopes=['https://www.googleapis.com/auth/spreadsheets', 'https://www.googleapis.com/auth/drive']
+    )
+    gc = gspread.authorize(credentials)
+    # Keep Sheets connections alive instead of a new TLS handshake per request
+    gc.session.mount('https://', HTTPAdapter(pool_connections=20, pool_maxsize=20))
+    return gc
+
+@st.cache_resource(show_spinner=False)
+def _open_sheet(creds_json, sheet_id):
+    """Open the spreadsheet once per sheet ID, reusing the authorized client"""
+    return _get_gspread_client(creds_json).open_by_key(sheet_id)
+
 def get_gsheet():
     """Connect to Google Sheet using service account credentials"""
     try:
@@ -23,76 +89,340 @@ def get_gsheet():
             st.error("❌ Google credentials not configured. See setup instructions.")
             return None
         
-        credentials = Credentials.from_service_account_info(
-            creds_dict,
-            scopes=['https://www.googleapis.com/auth/spreadsheets', 'https://www.googleapis.com/auth/drive']
-        )
-        gc = gspread.authorize(credentials)
-        
         # Get sheet by name (you'll update this with your sheet ID)
         sheet_id = st.secrets.get("GOOGLE_SHEET_ID")
         if not sheet_id:
             st.error("❌ GOOGLE_SHEET_ID not configured in secrets.")
             return None
         
-        sheet = gc.open_by_key(sheet_id)
-        return sheet
+        # st.secrets sections aren't hashable, so key the cache on their JSON form
+        return _open_sheet(json.dumps(dict(creds_dict), sort_keys=True), sheet_id)
     except Exception as e:
         st.error(f"❌ Error connecting to Google Sheets: {e}")
         return None
 
+# Tracker worksheet columns
+HEADERS = ["Date Added", "Company", "Position", "Location", "Salary",
+           "Stage", "Status", "Applied Date", "Source", "Notes", "URL", "Follow-up"]
+
+TRACKER_WORKSHEET = "Job Applications"
+SALARY_FORMAT = {"type": "CURRENCY", "pattern": "$#,##0"}
+
+def _salary_format_request(sheet_gid):
+    """batchUpdate request applying the currency format to the Salary column below the header"""
+    salary_col = HEADERS.index("Salary")
+    return {"repeatCell": {
+        "range": {"sheetId": sheet_gid, "startRowIndex": 1,
+                  "startColumnIndex": salary_col, "endColumnIndex": salary_col + 1},
+        "cell": {"userEnteredFormat": {"numberFormat": SALARY_FORMAT}},
+        "fields": "userEnteredFormat.numberFormat"
+    }}
+
+def _create_tracker_worksheet(sheet, sheet_gid):
+    """Add the worksheet, its header row and the salary column format in one batchUpdate"""
+    response = sheet.batch_update({"requests": [
+        {"addSheet": {"properties": {
+            "sheetId": sheet_gid,
+            "title": TRACKER_WORKSHEET,
+            "gridProperties": {"rowCount": 1000, "columnCount": len(HEADERS)}
+        }}},
+        {"updateCells": {
+            "start": {"sheetId": sheet_gid, "rowIndex": 0, "columnIndex": 0},
+            "rows": [{"values": [{"userEnteredValue": {"stringValue": h}} for h in HEADERS]}],
+            "fields": "userEnteredValue"
+        }},
+        _salary_format_request(sheet_gid)
+    ]})
+    return response["replies"][0]["addSheet"]["properties"]
+
+@st.cache_resource(show_spinner=False)
+def _get_tracker(_sheet, sheet_id, _create=True):
+    """Resolve (or create) the tracking worksheet once per process (cached per sheet ID)
+
+    Returns a shared dict with the worksheet, whether its header row exists and whether the
+    salary column has been formatted this process. With _create=False a missing worksheet
+    raises WorksheetNotFound instead (nothing is cached).
+    """
+    import gspread
+    
+    # One metadata fetch both finds the worksheet and tells us which sheet IDs are taken
+    sheets = [s["properties"] for s in _sheet.fetch_sheet_metadata()["sheets"]]
+    for properties in sheets:
+        if properties["title"] == TRACKER_WORKSHEET:
+            ws = gspread.Worksheet(_sheet, properties)
+            return {"ws": ws, "headers_written": bool(ws.row_values(1)), "salary_formatted": False}
+    
+    if not _create:
+        raise gspread.exceptions.WorksheetNotFound(TRACKER_WORKSHEET)
+    properties = _create_tracker_worksheet(_sheet, max(p["sheetId"] for p in sheets) + 1)
+    return {"ws": gspread.Worksheet(_sheet, properties), "headers_written": True,
+            "salary_formatted": True}
+
+def _worksheet_gone(error):
+    """True if a Sheets error means the worksheet was deleted or renamed, not a rate limit or outage"""
+    import gspread
+    
+    if isinstance(error, gspread.exceptions.WorksheetNotFound):
+        return True
+    # 400 covers "Unable to parse range" for a missing sheet title; 429s and 5xx keep the handle
+    return error.response.status_code in (400, 404)
+
+def _forget_tracker():
+    """Drop the cached worksheet handle so the next action finds (or recreates) the sheet
+
+    Called when a request shows the worksheet is gone, e.g. after it was deleted or renamed.
+    """
+    _get_tracker.clear()
+    load_tracker_rows.clear()
+
+def _format_salary_column(ws, tracker):
+    """Best-effort currency format for the salary column; the rows are already written"""
+    try:
+        ws.spreadsheet.batch_update({"requests": [_salary_format_request(ws.id)]})
+        tracker["salary_formatted"] = True
+    except Exception as e:
+        # e.g. a 429; leave the flag unset so the next append tries again
+        logger.warning("Could not format the salary column: %s", e)
+
+def append_job_rows(ws, rows):
+    """Append job rows in one request, writing the header row first if the sheet is empty"""
+    if not rows:
+        return
+    
+    import gspread
+    
+    tracker = _get_tracker(ws.spreadsheet, ws.spreadsheet.id)
+    values = rows if tracker["headers_written"] else [HEADERS, *rows]
+    try:
+        # RAW skips server-side parsing, so a title starting with "=" stays text
+        ws.append_rows(values, value_input_option="RAW", insert_data_option="INSERT_ROWS",
+                       table_range="A1")
+    except (gspread.exceptions.APIError, gspread.exceptions.WorksheetNotFound) as e:
+        if _worksheet_gone(e):
+            _forget_tracker()
+        raise
+    tracker["headers_written"] = True
+    load_tracker_rows.clear()
+    
+    # Salary is stored as a number; existing trackers get the currency format once per process
+    if not tracker["salary_formatted"]:
+        _format_salary_column(ws, tracker)
+
+def tracked_companies(ws):
+    """Lowercased company names already in the tracker, read from the cached rows"""
+    rows = load_tracker_rows(ws, ws.spreadsheet.id)
+    if not rows or "Company" not in rows[0]:
+        return set()
+    col = rows[0].index("Company")
+    return {row[col].lower() for row in rows[1:] if len(row) > col}
+
+# Single-job adds are queued and written together once this many are pending
+PENDING_FLUSH_SIZE = 20
+
+def flush_pending_rows(ws):
+    """Write every queued single-job row in one append request, returning the count"""
+    pending_rows = st.session_state.pending_rows
+    append_job_rows(ws, pending_rows)
+    st.session_state.pending_rows = []
+    return len(pending_rows)
+
+def _get_ws(create=True):
+    """Return the cached tracking worksheet, or None if unavailable
+
+    Read-only views pass create=False so merely rendering them never adds a worksheet.
+    """
+    import gspread
+    
+    sheet = get_gsheet()
+    if not sheet:
+        return None
+    try:
+        return _get_tracker(sheet, sheet.id, create)["ws"]
+    except gspread.exceptions.WorksheetNotFound:
+        st.info("Tracking sheet not yet created. Go to Job Search tab to add your first job!")
+        return None
+    except Exception as e:
+        st.error(f"❌ Error opening tracking worksheet: {e}")
+        return None
+
+@st.cache_data(ttl=60, show_spinner=False)
+def load_tracker_rows(_ws, sheet_id):
+    """Fetch all tracker values (header row first) in one request, cached for a minute"""
+    import gspread
+    
+    try:
+        return _ws.get_all_values()
+    except (gspread.exceptions.APIError, gspread.exceptions.WorksheetNotFound) as e:
+        if _worksheet_gone(e):
+            _forget_tracker()
+        raise
+
+@st.cache_data(show_spinner=False)
+def summarize_tracker(data, today):
+    """Pipeline counts, per-source stats and follow-ups for the tracker rows as of `today`"""
+    # Calculate pipeline metrics, source stats and follow-ups in a single pass
+    total = len(data)
+    to_apply = applied = interviews = offers = 0
+    sources = {}
+    follow_ups_needed = []
+    now = datetime.strptime(today, '%Y-%m-%d')
+    for row in data:
+        status = row.get('Status', '')
+        applied_date_str = row.get('Applied Date', '')
+        has_applied_date = bool(applied_date_str)
+        is_interview = "Interview" in status
+        
+        if "To Apply" in status:
+            to_apply += 1
+        if "Applied" in status or has_applied_date:
+            applied += 1
+        if is_interview:
+            interviews += 1
+        if "Offer" in status:
+            offers += 1
+        
+        source = row.get('Source', 'Unknown')
+        source_metrics = sources.setdefault(source, {'total': 0, 'applied': 0, 'interviews': 0})
+        source_metrics['total'] += 1
+        if has_applied_date:
+            source_metrics['applied'] += 1
+        if is_interview:
+            source_metrics['interviews'] += 1
+        
+        # Find jobs that need follow-ups (applied 14+ days ago, not in advanced stage)
+        if applied_date_str.strip():
+            try:
+                applied_date = datetime.strptime(applied_date_str, '%Y-%m-%d')
+                days_ago = (now - applied_date).days
+                
+                # Flag if applied 14+ days ago and not in advanced stage
+                if days_ago >= 14 and not is_interview and "Offer" not in status and "Decision" not in status:
+                    follow_ups_needed.append({
+                        'company': row.get('Company', ''),
+                        'position': row.get('Position', ''),
+                        'applied_date': applied_date_str,
+                        'days_ago': days_ago,
+                        'status': status,
+                        'url': row.get('URL', '')
+                    })
+            except:
+                pass
+    
+    return {
+        'total': total,
+        'to_apply': to_apply,
+        'applied': applied,
+        'interviews': interviews,
+        'offers': offers,
+        'sources': sources,
+        'follow_ups_needed': follow_ups_needed
+    }
+
+# Job matching criteria
+ACCEPTABLE_TITLES = ["VP Sales", "VP of Sales", "Head of Sales", "VP Business Development", 
+                     "VP, Sales", "VP - Sales", "Vice President Sales", "Vice President of Sales",
+                     "Sales VP", "Chief Revenue Officer"]
+STAGE_KEYWORDS = ['growth', 'series', 'seed', 'early stage', '1st hire', 'first hire', 
+                  'first vp', '1st vp', 'scaling', 'pre-series']
+REMOTE_LOCATION_KEYWORDS = ['remote', 'nevada', 'nv', 'las vegas', 'henderson', 'reno', 'carson city']
+CA_LOCATION_KEYWORDS = ['california', 'ca', 'sf', 'san francisco', 'los angeles', 'la']
+LOCAL_SALARY_MIN = 170000       # remote, Nevada or California
+RELOCATION_SALARY_MIN = 250000  # anywhere else
+
+def _keyword_re(keywords):
+    """Compile an alternation matching any of the keywords in lowercased text"""
+    return re.compile('|'.join(re.escape(k.lower()) for k in keywords))
+
+def _word_re(keywords):
+    """Like _keyword_re, but keywords only match as whole words ('ca' not in 'chicago')"""
+    alternation = '|'.join(re.escape(k.lower()).replace(r'\ ', r'\s+') for k in keywords)
+    return re.compile(rf'\b(?:{alternation})\b')
+
+_TITLE_RE = _keyword_re(ACCEPTABLE_TITLES)
+_STAGE_RE = _keyword_re(STAGE_KEYWORDS)
+_LOC_REMOTE_RE = _word_re(REMOTE_LOCATION_KEYWORDS)
+_LOC_CA_RE = _word_re(CA_LOCATION_KEYWORDS)
+
 # Job matching logic
 def matches_criteria(job):
     """Check if job matches JR's search criteria"""
     
-    # Title matching
-    acceptable_titles = ["VP Sales", "VP of Sales", "Head of Sales", "VP Business Development", 
-                         "VP, Sales", "VP - Sales", "Vice President Sales", "Vice President of Sales",
-                         "Sales VP", "Chief Revenue Officer"]
-    
-    title_match = any(title.lower() in job.get('title', '').lower() for title in acceptable_titles)
-    if not title_match:
+    # Title matching (rejects most postings, so it runs before any other work)
+    if not _TITLE_RE.search((job.get('title') or '').lower()):
         return False, "Title doesn't match criteria"
     
-    # Salary matching
-    salary = job.get('salary_min', 0)
-    location = job.get('location', '').lower()
-    
-    # Remote or Nevada = $170k minimum
-    if 'remote' in location or 'nevada' in location or location == '':
-        if salary < 170000:
-            return False, f"Salary ${salary} below $170k minimum for remote/Nevada"
-    # California is acceptable
-    elif 'california' in location or 'ca' in location or 'sf' in location or 'san francisco' in location or 'los angeles' in location or 'la' in location:
-        if salary < 170000:
-            return False, f"Salary ${salary} below $170k minimum"
-    # Other locations need $250k minimum base
+    # Location picks the salary floor: remote/Nevada/California vs. out-of-state relocation
+    location = (job.get('location') or '').lower()
+    if not location or _LOC_REMOTE_RE.search(location) or _LOC_CA_RE.search(location):
+        threshold, reason = LOCAL_SALARY_MIN, "for remote/Nevada/California"
     else:
-        if salary < 250000:
-            return False, f"Salary ${salary} below $250k minimum for out-of-state relocation"
+        threshold, reason = RELOCATION_SALARY_MIN, "for out-of-state relocation"
     
-    # Company stage matching
-    company_stage = job.get('company_stage', '').lower()
-    stage_keywords = ['growth', 'series', 'seed', 'early stage', '1st hire', 'first hire', 
-                      'first vp', '1st vp', 'scaling', 'pre-series']
-    stage_match = any(keyword in company_stage for keyword in stage_keywords)
+    # Salary matching (one comparison against the chosen floor)
+    salary = int(job.get('salary_min') or 0)
+    if salary < threshold:
+        return False, f"Salary ${salary} below ${threshold // 1000}k minimum {reason}"
     
-    if not stage_match and job.get('company_stage', ''):
+    # Company stage matching
+    company_stage = (job.get('company_stage') or '').lower()
+    if company_stage and not _STAGE_RE.search(company_stage):
         return False, "Company stage not growth stage or seeking first VP Sales"
     
     return True, "✓ Matches all criteria"
 
-# Email drafting
-def draft_email(job):
-    """Use Claude to draft personalized outreach email"""
+@st.cache_data(max_entries=5000, show_spinner=False)
+def matches_criteria_cached(title, location, salary, stage):
+    """Memoized matches_criteria keyed on just the fields the criteria read"""
+    return matches_criteria({'title': title, 'location': location,
+                             'salary_min': salary, 'company_stage': stage})
+
+def _text_col(df, name):
+    """Return a column as lowercased strings, or an all-empty column if it's missing"""
+    if name in df:
+        return df[name].astype(str).str.lower()
+    return pd.Series('', index=df.index)
+
+def match_mask(df):
+    """Vectorized matches_criteria: boolean Series marking jobs that meet every criterion"""
+    title_ok = _text_col(df, 'title').str.contains(_TITLE_RE)
+    
+    # Remote, Nevada or California use the local salary floor, other locations the relocation one
+    location = _text_col(df, 'location')
+    local_like = (location == '') | location.str.contains(_LOC_REMOTE_RE) | location.str.contains(_LOC_CA_RE)
+    if 'salary_min' in df:
+        salary = pd.to_numeric(df['salary_min'], errors='coerce').fillna(0)
+    else:
+        salary = pd.Series(0, index=df.index)
+    salary_ok = salary >= local_like.map({True: LOCAL_SALARY_MIN, False: RELOCATION_SALARY_MIN})
     
-    prompt = f"""Draft a compelling but authentic outreach email for JR to send to a hiring manager or recruiter at this company:
+    company_stage = _text_col(df, 'company_stage')
+    stage_ok = (company_stage == '') | company_stage.str.contains(_STAGE_RE)
+    
+    return title_ok & salary_ok & stage_ok
 
-Company: {job.get('company_name', 'Company')}
-Position: {job.get('title', 'Role')}
-Company Description: {job.get('company_description', 'N/A')}
-Location: {job.get('location', 'TBD')}
-Salary Range: ${job.get('salary_min', 'TBD'):,}
+# Job import parsing
+def parse_jobs(jobs_text):
+    """Parse pasted JSON or CSV job data into a DataFrame with normalized columns"""
+    try:
+        # Try parsing as JSON first (orjson is faster; both raise ValueError subclasses)
+        jobs = orjson.loads(jobs_text.encode('utf-8')) if orjson else json.loads(jobs_text)
+        jobs_df = pd.DataFrame(jobs if isinstance(jobs, list) else [jobs])
+    except ValueError:
+        # Try parsing as CSV
+        try:
+            jobs_df = pd.read_csv(io.StringIO(jobs_text))
+        except ValueError:
+            return pd.DataFrame()
+    
+    jobs_df.columns = jobs_df.columns.astype(str).str.strip().str.lower().str.replace(' ', '_')
+    if 'salary_min' in jobs_df:
+        jobs_df['salary_min'] = pd.to_numeric(jobs_df['salary_min'], errors='coerce').fillna(0).astype(int)
+    return jobs_df.fillna('')
+
+# Email drafting
+EMAIL_MODEL = "claude-opus-4-5-20251101"
+
+JR_BACKGROUND_AND_GUIDELINES = f"""You draft compelling but authentic outreach emails for JR to send to a hiring manager or recruiter at a company JR wants to work for. Each request gives you one company and role.
 
 JR's Background:
 - 15+ years B2B SaaS VP Sales experience
@@ -103,27 +433,197 @@ JR's Background:
 - Based in Las Vegas, new father
 - Positioning: "Anti-guru operator who shares actual playbooks rather than motivation"
 
+JR's search criteria (every role you're given has already passed these):
+- Titles: {', '.join(ACCEPTABLE_TITLES)}
+- Salary: $170k+ base for remote, Nevada or California roles; $250k+ base for anything requiring relocation elsewhere
+- Company stage: growth stage ({', '.join(STAGE_KEYWORDS)}) or seeking their first VP Sales
+
 Email guidelines:
 - Keep it short (150-200 words max)
 - Show you've done research on the company
 - Lead with a specific achievement or relevant experience
 - Include a clear ask (brief call, coffee)
 - Authentic tone - not salesy
-- Reference that you bring actual playbooks and frameworks, not theory
+- Reference that you bring actual playbooks and frameworks, not theory"""
+
+# Static system prompt, marked so Anthropic can cache it across drafts
+EMAIL_SYSTEM = [
+    {"type": "text", "text": JR_BACKGROUND_AND_GUIDELINES, "cache_control": {"type": "ephemeral"}}
+]
+
+def _build_messages(job):
+    """Build the per-job user message; everything static lives in EMAIL_SYSTEM"""
+    job_details = f"""Company: {job.get('company_name', 'Company')}
+Position: {job.get('title', 'Role')}
+Company Description: {job.get('company_description', 'N/A')}
+Location: {job.get('location', 'TBD')}
+Salary Range: ${job.get('salary_min', 'TBD'):,}
 
 Draft the email now:"""
+    return [
+        {"role": "user", "content": [{"type": "text", "text": job_details}]}
+    ]
+
+def _log_cache_usage(message):
+    """Log prompt-cache reads so cache hits can be confirmed"""
+    logger.info("Email draft used %s cached input tokens", message.usage.cache_read_input_tokens)
+
+# Finished drafts are reused for an hour for the same company/role
+DRAFT_CACHE_TTL = 3600
+
+@st.cache_resource(show_spinner=False)
+def _draft_cache():
+    """Shared {job signature: (created_at, draft)} store for finished email drafts"""
+    return {}
 
+@st.cache_resource(show_spinner=False)
+def _draft_cache_lock():
+    """Lock guarding _draft_cache, which every session thread reads and writes"""
+    return threading.Lock()
+
+def _draft_signature(job):
+    """The job fields that feed the prompt, so unrelated keys don't bust the cache"""
+    return (job.get('company_name'), job.get('title'), job.get('company_description'),
+            job.get('location'), job.get('salary_min'))
+
+def _get_cached_draft(job):
+    """Return a cached draft for this job if it's still fresh, else None"""
+    with _draft_cache_lock():
+        entry = _draft_cache().get(_draft_signature(job))
+    if entry and time.time() - entry[0] < DRAFT_CACHE_TTL:
+        return entry[1]
+    return None
+
+def _store_draft(job, draft):
+    """Cache a successful draft, dropping any expired entries"""
+    cache = _draft_cache()
+    now = time.time()
+    with _draft_cache_lock():
+        for signature in [sig for sig, (created_at, _) in cache.items() if now - created_at >= DRAFT_CACHE_TTL]:
+            cache.pop(signature, None)
+        cache[_draft_signature(job)] = (now, draft)
+
+def draft_email_stream(job):
+    """Stream an email draft for the interactive UI, yielding text as it's generated"""
+    # A repeat request for the same job yields the finished draft in one piece
+    cached = _get_cached_draft(job)
+    if cached is not None:
+        yield cached
+        return
+    
+    client = get_anthropic_client()
+    if client is None:
+        yield MISSING_KEY_MESSAGE
+        return
+    
     try:
-        message = client.messages.create(
-            model="claude-opus-4-5-20251101",
+        with client.messages.stream(
+            model=EMAIL_MODEL,
             max_tokens=500,
-            messages=[
-                {"role": "user", "content": prompt}
-            ]
-        )
-        return message.content[0].text
+            system=EMAIL_SYSTEM,
+            messages=_build_messages(job)
+        ) as stream:
+            yield from stream.text_stream
+            final_message = stream.get_final_message()
+    except Exception as e:
+        yield f"Error generating email: {e}"
+        return
+    
+    # The full draft has been shown by now, so bookkeeping failures must not add error text to it
+    try:
+        _log_cache_usage(final_message)
+        _store_draft(job, final_message.content[0].text)
     except Exception as e:
-        return f"Error generating email: {e}"
+        logger.warning("Could not cache the streamed email draft: %s", e)
+
+def submit_email_batch(jobs):
+    """Queue drafts on the Message Batches API (half the cost, not interactive)
+
+    Jobs with a fresh cached draft are left out. Returns (batch ID, {job index: cached draft});
+    the batch ID is None when every job was already cached.
+    """
+    cached = {}
+    for i, job in enumerate(jobs):
+        draft = _get_cached_draft(job)
+        if draft is not None:
+            cached[i] = draft
+    if len(cached) == len(jobs):
+        return None, cached
+    
+    batch_requests = [
+        {
+            "custom_id": f"job-{i}",
+            "params": {
+                "model": EMAIL_MODEL,
+                "max_tokens": 500,
+                "system": EMAIL_SYSTEM,
+                "messages": _build_messages(job)
+            }
+        }
+        for i, job in enumerate(jobs) if i not in cached
+    ]
+    
+    client = get_anthropic_client()
+    if client is None:
+        raise RuntimeError(MISSING_KEY_MESSAGE)
+    return client.messages.batches.create(requests=batch_requests).id, cached
+
+def collect_email_batch(batch_id, jobs, cached):
+    """Return a finished batch's drafts (merged with `cached`) in job order, or None while it's still processing"""
+    client = get_anthropic_client()
+    if client is None:
+        raise RuntimeError(MISSING_KEY_MESSAGE)
+    
+    # Batches can take up to 24h, so this checks once instead of blocking the script thread
+    if client.messages.batches.retrieve(batch_id).processing_status != "ended":
+        return None
+    
+    drafts = {f"job-{i}": draft for i, draft in cached.items()}
+    for entry in client.messages.batches.results(batch_id):
+        if entry.result.type == "succeeded":
+            drafts[entry.custom_id] = entry.result.message.content[0].text
+            _store_draft(jobs[int(entry.custom_id.split("-")[1])], drafts[entry.custom_id])
+        else:
+            drafts[entry.custom_id] = f"Error generating email: request {entry.result.type}"
+    return [drafts.get(f"job-{i}", "Error generating email: no result returned") for i in range(len(jobs))]
+
+async def _draft_one(async_client, job, sem):
+    """Draft one email, reusing a cached draft or waiting on the semaphore to bound concurrency"""
+    cached = _get_cached_draft(job)
+    if cached is not None:
+        return cached
+    
+    async with sem:
+        message = await async_client.messages.create(
+            model=EMAIL_MODEL,
+            max_tokens=500,
+            system=EMAIL_SYSTEM,
+            messages=_build_messages(job)
+        )
+        _log_cache_usage(message)
+        draft = message.content[0].text
+        _store_draft(job, draft)
+        return draft
+
+async def draft_batch(jobs, concurrency=5):
+    """Draft emails for many jobs concurrently, in the same order as `jobs`"""
+    import anthropic
+    
+    api_key = st.secrets.get("ANTHROPIC_API_KEY")
+    if not api_key:
+        return [MISSING_KEY_MESSAGE] * len(jobs)
+    
+    sem = asyncio.Semaphore(concurrency)
+    # The async client is tied to the event loop, so open one per asyncio.run()
+    async with anthropic.AsyncAnthropic(api_key=api_key, max_retries=ANTHROPIC_MAX_RETRIES) as async_client:
+        results = await asyncio.gather(*[_draft_one(async_client, job, sem) for job in jobs],
+                                       return_exceptions=True)
+    return [f"Error generating email: {r}" if isinstance(r, Exception) else r for r in results]
+
+def _reset_batch_results():
+    """Drop the last import's matches and drafts when new pasted data is submitted"""
+    st.session_state.matched_jobs = []
+    st.session_state.batch_drafts = []
 
 # Main app UI
 st.title("🎯 VP Sales Job Search Agent")
@@ -161,25 +661,29 @@ with tab1:
                             ["Paste Single Job Details", "Paste CSV/JSON"])
     
     if input_method == "Paste Single Job Details":
-        col1, col2 = st.columns(2)
-        with col1:
-            job_title = st.text_input("Job Title")
-            company_name = st.text_input("Company Name")
-            salary_min = st.number_input("Minimum Salary", value=170000, step=10000)
-        
-        with col2:
-            location = st.text_input("Location (remote, state, city)")
-            company_stage = st.text_input("Company Stage (e.g., Series B, Growth)")
-            company_description = st.text_area("Company Description (optional)")
-        
-        job_url = st.text_input("Job URL (optional)")
-        
-        col_source = st.columns(1)[0]
-        source = st.selectbox("Source", 
-                             ["LinkedIn", "AngelList", "Indeed", "Greenhouse", "Direct Company", "Other"],
-                             key="source_single")
+        # Inputs only rerun the script on submit, not on every keystroke
+        with st.form("single_job", clear_on_submit=False):
+            col1, col2 = st.columns(2)
+            with col1:
+                job_title = st.text_input("Job Title")
+                company_name = st.text_input("Company Name")
+                salary_min = st.number_input("Minimum Salary", value=170000, step=10000)
+            
+            with col2:
+                location = st.text_input("Location (remote, state, city)")
+                company_stage = st.text_input("Company Stage (e.g., Series B, Growth)")
+                company_description = st.text_area("Company Description (optional)")
+            
+            job_url = st.text_input("Job URL (optional)")
+            
+            col_source = st.columns(1)[0]
+            source = st.selectbox("Source", 
+                                 ["LinkedIn", "AngelList", "Indeed", "Greenhouse", "Direct Company", "Other"],
+                                 key="source_single")
+            
+            submitted = st.form_submit_button("✅ Add Job")
         
-        if st.button("✅ Add Job"):
+        if submitted:
             job = {
                 'title': job_title,
                 'company_name': company_name,
@@ -192,39 +696,27 @@ with tab1:
                 'source': source
             }
             
-            matches, reason = matches_criteria(job)
+            matches, reason = matches_criteria_cached(job_title, location, salary_min, company_stage)
             
             if matches:
-                sheet = get_gsheet()
-                if sheet:
+                ws = _get_ws()
+                if ws:
                     try:
-                        # Get or create tracking worksheet
-                        try:
-                            ws = sheet.worksheet("Job Applications")
-                        except:
-                            ws = sheet.add_worksheet("Job Applications", rows=1000, cols=12)
-                        
-                        # Add headers if empty
-                        if ws.cell(1, 1).value is None:
-                            headers = ["Date Added", "Company", "Position", "Location", "Salary", 
-                                     "Stage", "Status", "Applied Date", "Source", "Notes", "URL", "Follow-up"]
-                            ws.append_row(headers)
-                        
-                        # Check for duplicates
-                        existing_rows = ws.get_all_records()
-                        company_exists = any(row.get('Company', '').lower() == company_name.lower() 
-                                            for row in existing_rows)
+                        # Check for duplicates, including jobs still waiting to be written
+                        pending_rows = st.session_state.pending_rows
+                        company_exists = (company_name.lower() in tracked_companies(ws) or
+                                          any(row[1].lower() == company_name.lower() for row in pending_rows))
                         
                         if company_exists:
                             st.warning(f"⚠️ You already have {company_name} in your tracker! Skipped to avoid duplicates.")
                         else:
-                            # Append job data
-                            ws.append_row([
+                            # Queue job data; it's written in one request with the rest of the queue
+                            pending_rows.append([
                                 job.get('date_added', datetime.now().strftime('%Y-%m-%d')),
                                 job.get('company_name'),
                                 job.get('title'),
                                 job.get('location'),
-                                f"${job.get('salary_min'):,}",
+                                int(job.get('salary_min') or 0),
                                 job.get('company_stage'),
                                 "📋 To Apply",
                                 "",
@@ -234,62 +726,80 @@ with tab1:
                                 ""
                             ])
                             
-                            st.success(f"✅ {reason}\n✅ Added to tracker!")
+                            # Remember the job for the email drafting step
+                            st.session_state.current_job = job
+                            st.session_state.current_email = None
+                            
+                            if len(pending_rows) >= PENDING_FLUSH_SIZE:
+                                flushed = flush_pending_rows(ws)
+                                st.success(f"✅ {reason}\n✅ Added {flushed} jobs to tracker!")
+                            else:
+                                st.success(f"✅ {reason}\n✅ Queued for tracker ({len(pending_rows)} pending)")
                     except Exception as e:
                         st.error(f"Error logging to sheet: {e}")
             else:
                 st.warning(f"⚠️ {reason}")
+        
+        # Write queued jobs on demand instead of waiting for a full batch
+        pending_count = len(st.session_state.pending_rows)
+        if pending_count:
+            if st.button(f"📤 Flush Pending ({pending_count})"):
+                ws = _get_ws()
+                if ws:
+                    try:
+                        flushed = flush_pending_rows(ws)
+                        st.success(f"✅ Added {flushed} jobs to tracker!")
+                    except Exception as e:
+                        st.error(f"Error logging to sheet: {e}")
+            else:
+                st.info(f"📤 {pending_count} jobs are queued and not yet saved to your tracker.")
+        
+        # Draft an outreach email for the last job added from this form
+        current_job = st.session_state.current_job
+        if current_job:
+            if st.button(f"✉️ Draft Email to {current_job.get('company_name') or 'Company'}"):
+                # Render tokens as they arrive; write_stream returns the full text
+                st.session_state.current_email = st.write_stream(draft_email_stream(current_job))
+            elif st.session_state.current_email:
+                st.markdown(st.session_state.current_email)
     
     elif input_method == "Paste CSV/JSON":
         st.info("Paste your jobs data in CSV or JSON format. Matching jobs will be automatically added to your tracker.")
         
-        col1, col2 = st.columns(2)
-        with col1:
-            default_source = st.selectbox("Default Source (if not in data)", 
-                                         ["LinkedIn", "AngelList", "Indeed", "Greenhouse", "Direct Company", "Other"],
-                                         key="source_batch")
-        
-        jobs_text = st.text_area("Paste jobs data here", height=300)
+        # Nothing is parsed until the form is submitted; submitting drops the last import's results
+        with st.form("batch_jobs", clear_on_submit=False):
+            col1, col2 = st.columns(2)
+            with col1:
+                default_source = st.selectbox("Default Source (if not in data)", 
+                                             ["LinkedIn", "AngelList", "Indeed", "Greenhouse", "Direct Company", "Other"],
+                                             key="source_batch")
+            
+            jobs_text = st.text_area("Paste jobs data here", height=300)
+            
+            submitted = st.form_submit_button("📥 Parse & Auto-Add Matching Jobs",
+                                              on_click=_reset_batch_results)
         
-        if st.button("📥 Parse & Auto-Add Matching Jobs"):
-            try:
-                # Try parsing as JSON first
-                jobs = json.loads(jobs_text)
-                if not isinstance(jobs, list):
-                    jobs = [jobs]
-            except:
-                # Try parsing as CSV
-                import csv
-                import io
-                jobs = list(csv.DictReader(io.StringIO(jobs_text)))
+        if submitted:
+            jobs_df = parse_jobs(jobs_text)
             
-            if jobs:
-                sheet = get_gsheet()
-                if sheet:
+            if not jobs_df.empty:
+                ws = _get_ws()
+                if ws:
                     try:
-                        # Get or create tracking worksheet
-                        try:
-                            ws = sheet.worksheet("Job Applications")
-                        except:
-                            ws = sheet.add_worksheet("Job Applications", rows=1000, cols=12)
-                        
-                        # Add headers if empty
-                        if ws.cell(1, 1).value is None:
-                            headers = ["Date Added", "Company", "Position", "Location", "Salary", 
-                                     "Stage", "Status", "Applied Date", "Source", "Notes", "URL", "Follow-up"]
-                            ws.append_row(headers)
+                        # Get existing companies to check for duplicates, including queued single-job adds
+                        existing_companies = tracked_companies(ws) | {
+                            row[1].lower() for row in st.session_state.pending_rows}
                         
-                        # Get existing companies to check for duplicates
-                        existing_rows = ws.get_all_records()
-                        existing_companies = {row.get('Company', '').lower() for row in existing_rows}
-                        
-                        # Filter and add matching jobs
+                        # Filter in one vectorized pass, then only visit the matching rows
+                        mask = match_mask(jobs_df)
                         matching_count = 0
-                        rejected_count = 0
+                        rejected_count = int((~mask).sum())
                         duplicate_count = 0
                         
-                        for job in jobs:
-                            matches, reason = matches_criteria(job)
+                        rows_to_append = []
+                        matched_jobs = []
+                        
+                        for job in jobs_df[mask].to_dict(orient='records'):
                             company_name = job.get('company_name', '')
                             
                             # Check for duplicates
@@ -297,25 +807,30 @@ with tab1:
                                 duplicate_count += 1
                                 continue
                             
-                            if matches:
-                                ws.append_row([
-                                    datetime.now().strftime('%Y-%m-%d'),
-                                    company_name,
-                                    job.get('title', ''),
-                                    job.get('location', ''),
-                                    f"${job.get('salary_min', 0):,}",
-                                    job.get('company_stage', ''),
-                                    "📋 To Apply",
-                                    "",
-                                    job.get('source', default_source),
-                                    job.get('company_description', ''),
-                                    job.get('job_url', ''),
-                                    ""
-                                ])
-                                matching_count += 1
-                                existing_companies.add(company_name.lower())
-                            else:
-                                rejected_count += 1
+                            rows_to_append.append([
+                                datetime.now().strftime('%Y-%m-%d'),
+                                company_name,
+                                job.get('title', ''),
+                                job.get('location', ''),
+                                int(job.get('salary_min') or 0),
+                                job.get('company_stage', ''),
+                                "📋 To Apply",
+                                "",
+                                job.get('source') or default_source,
+                                job.get('company_description', ''),
+                                job.get('job_url', ''),
+                                ""
+                            ])
+                            matched_jobs.append(job)
+                            matching_count += 1
+                            existing_companies.add(company_name.lower())
+                        
+                        # Write all matching jobs in a single request
+                        append_job_rows(ws, rows_to_append)
+                        
+                        # Remember this import's matches for the email drafting step
+                        st.session_state.matched_jobs = matched_jobs
+                        st.session_state.batch_drafts = []
                         
                         st.success(f"✅ Added {matching_count} matching jobs to tracker!")
                         if duplicate_count > 0:
@@ -326,23 +841,73 @@ with tab1:
                         st.error(f"Error logging to sheet: {e}")
             else:
                 st.error("Could not parse jobs data. Try JSON or CSV format.")
+        
+        # Draft outreach emails for the jobs added by the last import
+        matched_jobs = st.session_state.matched_jobs
+        if matched_jobs:
+            col1, col2 = st.columns(2)
+            with col1:
+                if st.button(f"✉️ Draft Emails for {len(matched_jobs)} Matching Jobs"):
+                    with st.spinner("Drafting emails..."):
+                        st.session_state.batch_drafts = asyncio.run(draft_batch(matched_jobs))
+            with col2:
+                # Only one batch at a time; a new click would pay for the same drafts twice
+                if st.button("📦 Draft All via Batch API (50% cheaper, slower)",
+                             disabled=st.session_state.email_batch is not None):
+                    try:
+                        batch_id, cached = submit_email_batch(matched_jobs)
+                        if batch_id is None:
+                            st.session_state.batch_drafts = [cached[i] for i in range(len(matched_jobs))]
+                        else:
+                            st.session_state.email_batch = {"id": batch_id, "jobs": matched_jobs,
+                                                            "cached": cached}
+                    except Exception as e:
+                        st.error(f"Error submitting batch: {e}")
+            
+            for idx, (job, draft) in enumerate(zip(matched_jobs, st.session_state.batch_drafts)):
+                with st.expander(f"✉️ {job.get('company_name', 'Company')} — {job.get('title', 'Role')}"):
+                    st.text_area("Email draft", draft, height=250, key=f"batch_draft_{idx}")
+        
+        # A submitted batch is kept by ID and collected on a later rerun, even after a new import
+        email_batch = st.session_state.email_batch
+        if email_batch:
+            st.info(f"📦 Batch {email_batch['id']} for {len(email_batch['jobs'])} jobs was submitted.")
+            if st.button("🔄 Check Batch Status"):
+                try:
+                    drafts = collect_email_batch(email_batch["id"], email_batch["jobs"],
+                                                 email_batch["cached"])
+                    if drafts is None:
+                        st.info("⏳ The batch is still processing. Check again in a few minutes.")
+                    else:
+                        st.session_state.matched_jobs = email_batch["jobs"]
+                        st.session_state.batch_drafts = drafts
+                        st.session_state.email_batch = None
+                        st.rerun()
+                except Exception as e:
+                    st.error(f"Error checking batch: {e}")
 
 with tab2:
     st.markdown("### 📊 Application Tracking & Pipeline")
     
-    sheet = get_gsheet()
-    if sheet:
+    ws = _get_ws(create=False)
+    if ws:
+        if st.button("🔄 Refresh"):
+            load_tracker_rows.clear()
+        
         try:
-            ws = sheet.worksheet("Job Applications")
-            data = ws.get_all_records()
+            rows = load_tracker_rows(ws, ws.spreadsheet.id)
+            headers = rows[0] if rows else []
+            data = [dict(zip(headers, row)) for row in rows[1:]]
             
             if data:
-                # Calculate metrics
-                total = len(data)
-                to_apply = sum(1 for row in data if "To Apply" in row.get('Status', ''))
-                applied = sum(1 for row in data if "Applied" in row.get('Status', '') or row.get('Applied Date'))
-                interviews = sum(1 for row in data if "Interview" in row.get('Status', ''))
-                offers = sum(1 for row in data if "Offer" in row.get('Status', ''))
+                summary = summarize_tracker(data, datetime.now().strftime('%Y-%m-%d'))
+                total = summary['total']
+                to_apply = summary['to_apply']
+                applied = summary['applied']
+                interviews = summary['interviews']
+                offers = summary['offers']
+                sources = summary['sources']
+                follow_ups_needed = summary['follow_ups_needed']
                 
                 # Calculate conversion rates
                 apply_rate = (applied / total * 100) if total > 0 else 0
@@ -367,17 +932,6 @@ with tab2:
                 # SOURCE TRACKING SECTION
                 st.markdown("### 📈 Source Performance")
                 
-                sources = {}
-                for row in data:
-                    source = row.get('Source', 'Unknown')
-                    if source not in sources:
-                        sources[source] = {'total': 0, 'applied': 0, 'interviews': 0}
-                    sources[source]['total'] += 1
-                    if row.get('Applied Date'):
-                        sources[source]['applied'] += 1
-                    if "Interview" in row.get('Status', ''):
-                        sources[source]['interviews'] += 1
-                
                 # Display source metrics
                 source_cols = st.columns(min(4, len(sources)))
                 for idx, (source, metrics) in enumerate(sorted(sources.items())):
@@ -394,32 +948,6 @@ with tab2:
                 # FOLLOW-UP REMINDERS SECTION
                 st.markdown("### ⏰ Follow-up Reminders")
                 
-                # Find jobs that need follow-ups (applied 14+ days ago, not in advanced stage)
-                from datetime import datetime, timedelta
-                
-                follow_ups_needed = []
-                for row in data:
-                    applied_date_str = row.get('Applied Date', '')
-                    status = row.get('Status', '')
-                    
-                    if applied_date_str and applied_date_str.strip():
-                        try:
-                            applied_date = datetime.strptime(applied_date_str, '%Y-%m-%d')
-                            days_ago = (datetime.now() - applied_date).days
-                            
-                            # Flag if applied 14+ days ago and not in advanced stage
-                            if days_ago >= 14 and "Interview" not in status and "Offer" not in status and "Decision" not in status:
-                                follow_ups_needed.append({
-                                    'company': row.get('Company', ''),
-                                    'position': row.get('Position', ''),
-                                    'applied_date': applied_date_str,
-                                    'days_ago': days_ago,
-                                    'status': status,
-                                    'url': row.get('URL', '')
-                                })
-                        except:
-                            pass
-                
                 if follow_ups_needed:
                     st.warning(f"🚨 {len(follow_ups_needed)} opportunities need follow-up!")
                     for job in sorted(follow_ups_needed, key=lambda x: x['days_ago'], reverse=True):
@@ -450,28 +978,21 @@ with tab2:
                     filtered_data = [row for row in data if status_filter in row.get('Status', '') or 
                                     (status_filter == "✉️ Applied" and row.get('Applied Date') and "Interview" not in row.get('Status', ''))]
                 
-                for row in filtered_data:
-                    col1, col2, col3 = st.columns([3, 1, 1])
-                    
-                    with col1:
-                        st.markdown(f"**{row.get('Company', 'Company')}** — {row.get('Position', 'Position')}")
-                        st.markdown(f"📍 {row.get('Location', 'Location')} • 💰 {row.get('Salary', 'TBD')} • 🏷️ {row.get('Source', '—')}")
-                    
-                    with col2:
-                        status_badge = row.get('Status', '📋 To Apply')
-                        st.markdown(status_badge)
-                    
-                    with col3:
-                        if row.get('URL'):
-                            st.markdown(f"[🔗 Link]({row.get('URL')})")
-                        else:
-                            st.markdown("*(No URL)*")
-                    
-                    st.markdown("---")
+                # One dataframe payload instead of a widget tree per row
+                st.dataframe(
+                    pd.DataFrame(filtered_data, columns=["Company", "Position", "Location", "Salary",
+                                                         "Source", "Status", "URL"]),
+                    column_config={
+                        "Salary": st.column_config.TextColumn("Salary"),
+                        "URL": st.column_config.LinkColumn("Link")
+                    },
+                    hide_index=True,
+                    use_container_width=True
+                )
             else:
                 st.info("No opportunities tracked yet. Go to Job Search tab to add jobs.")
         except Exception as e:
-            st.info(f"Tracking sheet not yet created. Go to Job Search tab to add your first job!")
+            st.error(f"❌ Error loading tracker: {e}")
 
 with tab3:
     st.markdown("### ⚙️ Setup & Deployment Instructions")
@@ -559,13 +1080,16 @@ with tab3:
     
     st.markdown("### 📦 Requirements.txt Contents")
     with st.expander("View requirements.txt"):
-        st.code("""streamlit==1.28.1
+        st.code("""streamlit==1.31.0
 gspread==5.10.0
 google-auth-oauthlib==1.1.0
 google-auth-httplib2==0.2.0
 google-cloud-storage==2.10.0
-anthropic==0.7.1""")
+anthropic==0.42.0
+httpx==0.27.0
+pandas==2.1.3
+orjson==3.9.10""")
 
 st.markdown("---")
 st.markdown("*Built for VP Sales job search • Last updated: Feb 2025*")
-march 3rd 2026
+# march 3rd 2026